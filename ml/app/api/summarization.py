@@ -1,9 +1,11 @@
 from fastapi import APIRouter, UploadFile, File, HTTPException
+from fastapi.responses import ORJSONResponse, StreamingResponse
 from pydantic import BaseModel
-from typing import Optional
+from typing import AsyncIterator, Optional
 from app.models.summarization import SummarizationModels
 from app.services.pdf_processor import PDFProcessor
 from app.services.youtube_processor import YouTubeProcessor
+import orjson
 import logging
 
 logger = logging.getLogger(__name__)
@@ -15,45 +17,101 @@ summarization_models = SummarizationModels()
 pdf_processor = PDFProcessor()
 youtube_processor = YouTubeProcessor()
 
+# Static model catalogue, built once instead of per request
+MODELS_INFO = {
+    "available_models": {
+        "facebook/bart-large-cnn": {
+            "name": "BART Large CNN",
+            "best_for": "News articles, general content, web articles",
+            "max_input_length": "1024 tokens",
+            "speed": "Medium",
+            "quality": "High"
+        },
+        "t5-small": {
+            "name": "T5 Small",
+            "best_for": "Fast summarization, short texts",
+            "max_input_length": "512 tokens",
+            "speed": "Fast",
+            "quality": "Medium"
+        },
+        "allenai/led-base-16384": {
+            "name": "LED (Longformer Encoder-Decoder)",
+            "best_for": "Long documents, research papers, books",
+            "max_input_length": "16384 tokens",
+            "speed": "Slow",
+            "quality": "Very High"
+        },
+        "google/pegasus-xsum": {
+            "name": "Pegasus XSum",
+            "best_for": "Research papers, scientific content, technical documents",
+            "max_input_length": "512 tokens",
+            "speed": "Medium",
+            "quality": "Very High"
+        }
+    },
+    "use_case_recommendations": {
+        "research_paper": "google/pegasus-xsum",
+        "news_article": "facebook/bart-large-cnn",
+        "long_document": "allenai/led-base-16384",
+        "user_manual": "allenai/led-base-16384",
+        "youtube_educational": "facebook/bart-large-cnn",
+        "youtube_technical": "google/pegasus-xsum",
+        "general": "facebook/bart-large-cnn",
+        "fast_processing": "t5-small"
+    }
+}
+
+TEXT_MODEL_NAMES = {
+    "bart": "facebook/bart-large-cnn",
+    "t5": "t5-small",
+    "led": "allenai/led-base-16384",
+    "pegasus": "google/pegasus-xsum"
+}
+
 # Request models
 class TextSummarizationRequest(BaseModel):
     text: str
     max_length: Optional[int] = 500
     format_with_tags: Optional[bool] = True
     model_type: Optional[str] = "auto"  # auto, bart, t5, led, pegasus
+    use_speculative: Optional[bool] = False  # Draft-model assisted decoding (bart, pegasus)
 
 class YouTubeSummarizationRequest(BaseModel):
     url: str
     max_length: Optional[int] = 500
     format_with_tags: Optional[bool] = True
 
+def _select_text_model(request: TextSummarizationRequest) -> str:
+    """Return the model key for a text request, auto-detecting from its length and content"""
+    if request.model_type == "auto":
+        if len(request.text) > 8000:
+            return "led"
+        text = request.text.lower()
+        if "research" in text or "study" in text:
+            return "pegasus"
+        return "bart"
+    return request.model_type if request.model_type in TEXT_MODEL_NAMES else "bart"
+
 @router.post("/summarize/text")
-async def summarize_text(request: TextSummarizationRequest):
-    """Summarize plain text using the best available model"""
+async def summarize_text(request: TextSummarizationRequest, cached: bool = True):
+    """Summarize plain text using the best available model, pass cached=false to regenerate"""
     try:
         # Choose model based on request or auto-detect
-        if request.model_type == "auto":
-            # Auto-detect best model based on text length and content
-            if len(request.text) > 8000:
-                model_method = summarization_models.summarize_with_led
-            elif "research" in request.text.lower() or "study" in request.text.lower():
-                model_method = summarization_models.summarize_with_pegasus
-            else:
-                model_method = summarization_models.summarize_with_bart
-        else:
-            model_methods = {
-                "bart": summarization_models.summarize_with_bart,
-                "t5": summarization_models.summarize_with_t5,
-                "led": summarization_models.summarize_with_led,
-                "pegasus": summarization_models.summarize_with_pegasus
-            }
-            model_method = model_methods.get(request.model_type, summarization_models.summarize_with_bart)
+        model_methods = {
+            "bart": summarization_models.summarize_with_bart,
+            "t5": summarization_models.summarize_with_t5,
+            "led": summarization_models.summarize_with_led,
+            "pegasus": summarization_models.summarize_with_pegasus
+        }
+        model_method = model_methods[_select_text_model(request)]
         
         # Generate summary
-        summary = model_method(
+        summary = await model_method(
             request.text, 
             request.max_length, 
-            request.format_with_tags
+            request.format_with_tags,
+            request.use_speculative,
+            cached
         )
         
         return {
@@ -68,16 +126,45 @@ async def summarize_text(request: TextSummarizationRequest):
         logger.error(f"Error in text summarization: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.post("/summarize/text/stream")
+async def summarize_text_stream(request: TextSummarizationRequest, cached: bool = True):
+    """Stream a text summary as server-sent events while it is being generated
+    
+    Each event carries a text piece; the final "end" event carries the complete summary,
+    formatted with tags when requested. Decoding is greedy, so results can differ from /summarize/text.
+    """
+    model_name = TEXT_MODEL_NAMES[_select_text_model(request)]
+    
+    async def events() -> AsyncIterator[bytes]:
+        pieces = []
+        try:
+            async for piece in summarization_models.stream_summary(request.text, model_name, request.max_length, cached):
+                pieces.append(piece)
+                yield b"data: " + orjson.dumps({"text": piece}) + b"\n\n"
+        except Exception as e:
+            logger.error(f"Error in streaming summarization: {e}")
+            yield b"event: error\ndata: " + orjson.dumps({"detail": str(e)}) + b"\n\n"
+            return
+        
+        summary = "".join(pieces).strip()
+        if request.format_with_tags:
+            summary = summarization_models.format_with_tags(summary)
+        yield b"event: end\ndata: " + orjson.dumps({"summary": summary, "model_used": model_name}) + b"\n\n"
+    
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    return StreamingResponse(events(), media_type="text/event-stream", headers=headers)
+
 @router.post("/summarize/pdf")
-async def summarize_pdf(file: UploadFile = File(...), max_length: int = 500, format_with_tags: bool = True):
-    """Extract text from PDF and generate summary"""
+async def summarize_pdf(file: UploadFile = File(...), max_length: int = 500, format_with_tags: bool = True,
+                        cached: bool = True):
+    """Extract text from PDF and generate summary, pass cached=false to regenerate"""
     try:
         # Validate file type
         if not file.filename.lower().endswith('.pdf'):
             raise HTTPException(status_code=400, detail="Only PDF files are supported")
         
         # Extract text from PDF
-        pdf_result = await pdf_processor.extract_text_from_pdf(file)
+        pdf_result = await pdf_processor.extract_text_from_pdf(file, use_cache=cached)
         
         if not pdf_result['success']:
             raise HTTPException(status_code=400, detail=pdf_result['error'])
@@ -90,11 +177,11 @@ async def summarize_pdf(file: UploadFile = File(...), max_length: int = 500, for
         
         # Choose appropriate model
         if doc_type == 'research_paper':
-            summary = summarization_models.summarize_with_pegasus(text, max_length, format_with_tags)
+            summary = await summarization_models.summarize_with_pegasus(text, max_length, format_with_tags, use_cache=cached)
         elif doc_type == 'long_document':
-            summary = summarization_models.summarize_with_led(text, max_length, format_with_tags)
+            summary = await summarization_models.summarize_with_led(text, max_length, format_with_tags, use_cache=cached)
         else:
-            summary = summarization_models.summarize_with_bart(text, max_length, format_with_tags)
+            summary = await summarization_models.summarize_with_bart(text, max_length, format_with_tags, use_cache=cached)
         
         return {
             "success": True,
@@ -116,11 +203,11 @@ async def summarize_pdf(file: UploadFile = File(...), max_length: int = 500, for
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/summarize/youtube")
-async def summarize_youtube(request: YouTubeSummarizationRequest):
-    """Extract transcript from YouTube video and generate summary with insights"""
+async def summarize_youtube(request: YouTubeSummarizationRequest, cached: bool = True):
+    """Extract transcript from YouTube video and generate summary with insights, pass cached=false to regenerate"""
     try:
         # Process YouTube video
-        video_result = await youtube_processor.process_youtube_video(request.url)
+        video_result = await youtube_processor.process_youtube_video(request.url, use_cache=cached)
         
         if not video_result['success']:
             raise HTTPException(status_code=400, detail=video_result['error'])
@@ -131,20 +218,20 @@ async def summarize_youtube(request: YouTubeSummarizationRequest):
         
         # Choose appropriate model based on content type
         if content_type == 'technical':
-            summary = summarization_models.summarize_with_pegasus(transcript, request.max_length, request.format_with_tags)
+            summary = await summarization_models.summarize_with_pegasus(transcript, request.max_length, request.format_with_tags, use_cache=cached)
             model_used = 'pegasus'
         elif content_type == 'educational':
-            summary = summarization_models.summarize_with_bart(transcript, request.max_length, request.format_with_tags)
+            summary = await summarization_models.summarize_with_bart(transcript, request.max_length, request.format_with_tags, use_cache=cached)
             model_used = 'bart'
         elif len(transcript) > 8000:
-            summary = summarization_models.summarize_with_led(transcript, request.max_length, request.format_with_tags)
+            summary = await summarization_models.summarize_with_led(transcript, request.max_length, request.format_with_tags, use_cache=cached)
             model_used = 'led'
         else:
-            summary = summarization_models.summarize_with_bart(transcript, request.max_length, request.format_with_tags)
+            summary = await summarization_models.summarize_with_bart(transcript, request.max_length, request.format_with_tags, use_cache=cached)
             model_used = 'bart'
         
         # Get video insights
-        insights = youtube_processor.get_video_insights(metadata, transcript)
+        insights = youtube_processor.get_video_insights(metadata, transcript, content_type)
         
         return {
             "success": True,
@@ -165,45 +252,4 @@ async def summarize_youtube(request: YouTubeSummarizationRequest):
 @router.get("/models/info")
 async def get_models_info():
     """Get information about available models and their use cases"""
-    return {
-        "available_models": {
-            "facebook/bart-large-cnn": {
-                "name": "BART Large CNN",
-                "best_for": "News articles, general content, web articles",
-                "max_input_length": "1024 tokens",
-                "speed": "Medium",
-                "quality": "High"
-            },
-            "t5-small": {
-                "name": "T5 Small",
-                "best_for": "Fast summarization, short texts",
-                "max_input_length": "512 tokens",
-                "speed": "Fast",
-                "quality": "Medium"
-            },
-            "allenai/led-base-16384": {
-                "name": "LED (Longformer Encoder-Decoder)",
-                "best_for": "Long documents, research papers, books",
-                "max_input_length": "16384 tokens",
-                "speed": "Slow",
-                "quality": "Very High"
-            },
-            "google/pegasus-xsum": {
-                "name": "Pegasus XSum",
-                "best_for": "Research papers, scientific content, technical documents",
-                "max_input_length": "1024 tokens",
-                "speed": "Medium",
-                "quality": "Very High"
-            }
-        },
-        "use_case_recommendations": {
-            "research_paper": "google/pegasus-xsum",
-            "news_article": "facebook/bart-large-cnn",
-            "long_document": "allenai/led-base-16384",
-            "user_manual": "allenai/led-base-16384",
-            "youtube_educational": "facebook/bart-large-cnn",
-            "youtube_technical": "google/pegasus-xsum",
-            "general": "facebook/bart-large-cnn",
-            "fast_processing": "t5-small"
-        }
-    }
\ No newline at end of file
+    return ORJSONResponse(MODELS_INFO, headers={"Cache-Control": "public, max-age=86400"})
\ No newline at end of file
@@ -0,0 +1,108 @@
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from typing import Callable, List, Optional
+from config.settings import get_settings
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+# Generation is CPU/GPU bound, so it runs here instead of on the event loop
+executor = ThreadPoolExecutor(max_workers=settings.inference_workers(), thread_name_prefix="inference")
+
+class BatchingScheduler:
+    """Collect concurrent requests for one model and run them as a single padded batch"""
+
+    def __init__(self, generate_fn: Callable[..., List[str]],
+                 max_batch: int = settings.MAX_BATCH, max_wait_ms: int = settings.MAX_WAIT_MS,
+                 semaphore: Optional[asyncio.Semaphore] = None):
+        self.generate_fn = generate_fn
+        # Shared across schedulers so all models together stay within the concurrency budget
+        self.semaphore = semaphore
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self.queue = None
+        self._worker = None
+
+    async def submit(self, text: str, *params) -> str:
+        """Queue a text for the next batch and wait for its summary
+
+        Requests are only batched with others that share the same generation params.
+        """
+        loop = asyncio.get_running_loop()
+        if self._worker is None:
+            self.queue = asyncio.Queue()
+            self._worker = loop.create_task(self._run())
+
+        future = loop.create_future()
+        await self.queue.put((text, params, future))
+        return await future
+
+    async def _run(self):
+        """Pull up to max_batch items, waiting at most max_wait after the first one"""
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            deadline = loop.time() + self.max_wait
+
+            while len(batch) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            await self._process_batch(batch)
+
+    async def _process_batch(self, batch: List[tuple]):
+        """Run one generate call per distinct set of params and resolve the waiting futures"""
+        groups = {}
+        for text, params, future in batch:
+            # Skip requests whose client has already gone away
+            if not future.done():
+                groups.setdefault(params, []).append((text, future))
+
+        for params, items in groups.items():
+            try:
+                summaries = await self._generate(items, params)
+            except Exception as e:
+                if len(items) == 1:
+                    self._fail(items, e)
+                    continue
+                # One bad input or an OOM on the padded batch shouldn't fail every request in it
+                logger.warning(f"Error generating batch of {len(items)}, retrying one at a time: {e}")
+                for item in items:
+                    if item[1].done():
+                        continue
+                    try:
+                        self._resolve([item], await self._generate([item], params))
+                    except Exception as item_error:
+                        self._fail([item], item_error)
+                continue
+
+            self._resolve(items, summaries)
+
+    async def _generate(self, items: List[tuple], params: tuple) -> List[str]:
+        """Run generate_fn on the executor for the given items"""
+        loop = asyncio.get_running_loop()
+        # The whole batch holds one slot, so limiting concurrency doesn't shrink batches
+        async with self.semaphore or nullcontext():
+            return await loop.run_in_executor(
+                executor, self.generate_fn, [text for text, _ in items], *params
+            )
+
+    def _resolve(self, items: List[tuple], summaries: List[str]):
+        """Hand each waiting request its summary"""
+        for (_, future), summary in zip(items, summaries):
+            if not future.done():
+                future.set_result(summary)
+
+    def _fail(self, items: List[tuple], error: Exception):
+        """Propagate a generation error to the waiting requests"""
+        logger.error(f"Error generating batch of {len(items)}: {error}")
+        for _, future in items:
+            if not future.done():
+                future.set_exception(error)
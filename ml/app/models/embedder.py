@@ -0,0 +1,38 @@
+from config.settings import get_settings
+from sentence_transformers import SentenceTransformer
+import torch
+import os
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+# One embedding model per process, shared by every caller
+_embedder = None
+_embedder_lock = threading.Lock()
+
+def get_embedder() -> SentenceTransformer:
+    """Return the shared sentence embedding model, loading and warming it on first call"""
+    global _embedder
+    if _embedder is None:
+        with _embedder_lock:
+            if _embedder is None:
+                _embedder = _load_embedder()
+    return _embedder
+
+def _load_embedder() -> SentenceTransformer:
+    """Load the embedding model onto the inference device and run one encode"""
+    model = SentenceTransformer(
+        settings.EMBEDDING_MODEL,
+        device=settings.device(),
+        cache_folder=os.path.join(settings.HF_CACHE_DIR, "sentence_transformers")
+    )
+    model.eval()
+
+    # The first encode initializes CUDA kernels and cuBLAS handles, do it before traffic arrives
+    with torch.inference_mode():
+        model.encode(["warmup"])
+
+    logger.info(f"Loaded {settings.EMBEDDING_MODEL}")
+    return model
@@ -1,115 +1,299 @@
-from transformers import AutoTokenizer, AutoModelForSeq2SeqLM, pipeline
+from config.settings import get_settings
+from transformers import (AutoTokenizer, AutoModelForSeq2SeqLM, BitsAndBytesConfig, StoppingCriteria,
+                          StoppingCriteriaList, TextIteratorStreamer, pipeline)
+from transformers.utils import is_bitsandbytes_available
 import torch
-from config.settings import Settings
+import aiohttp
+import asyncio
+import anyio
+from diskcache import Cache
+from cachetools import TTLCache
+from app.models.batching import BatchingScheduler, executor
+from app.utils.helpers import hash_key
+from app.utils.http_client import get_http_session
+from collections import OrderedDict
+from contextlib import nullcontext
+from typing import AsyncIterator, List
+import threading
 import logging
 
 logger = logging.getLogger(__name__)
+settings = get_settings()
+
+# Beam search width each model is served with, draft models and anything unlisted decode greedily
+GENERATION_BEAMS = {
+    "facebook/bart-large-cnn": 4,
+    # Greedy decoding, beam search buys little at T5-small's quality ceiling
+    "t5-small": 1,
+    # Fewer beams keep the KV cache of long inputs small
+    "allenai/led-base-16384": 2,
+    "google/pegasus-xsum": 4
+}
+
+# Longest input each model accepts in tokens, longer texts are truncated; unlisted models take 1024
+INPUT_TOKEN_LIMITS = {
+    "facebook/bart-large-cnn": 1024,
+    "t5-small": 512,
+    "allenai/led-base-16384": 16384,
+    "google/pegasus-xsum": 512
+}
+
+# Raw summaries are cached before tag formatting, so both output formats share an entry
+summary_cache = Cache(settings.SUMMARY_CACHE_DIR, size_limit=settings.SUMMARY_CACHE_SIZE_LIMIT)
+
+class CancelledCriteria(StoppingCriteria):
+    """Stop generation once the event is set, e.g. when a streaming client disconnects"""
+    
+    def __init__(self, cancelled: threading.Event):
+        self.cancelled = cancelled
+    
+    def __call__(self, input_ids: torch.LongTensor, scores: torch.FloatTensor, **kwargs) -> torch.BoolTensor:
+        return torch.full((input_ids.shape[0],), self.cancelled.is_set(), dtype=torch.bool, device=input_ids.device)
 
 class SummarizationModels:
     def __init__(self):
-        self.device = Settings.DEVICE
-        self.models = {}
+        self.device = settings.device()
+        self.models = OrderedDict()  # Least recently used first
         self.tokenizers = {}
-        self._load_models()
-    
-    def _load_models(self):
-        """Load all summarization models"""
-        try:
+        self.schedulers = {}
+        self.memory_cache = TTLCache(maxsize=settings.MEMORY_CACHE_SIZE, ttl=settings.MEMORY_CACHE_TTL)
+        self._load_lock = threading.Lock()
+        self.generation_semaphore = None  # Set by the app lifespan, bounds concurrent batch generations
+        
+        # Models are loaded on first use, so the worker starts without any weights in memory
+        self._loaders = {
             # BART Large CNN - Best for news/article summarization
-            self._load_bart_model()
-            
+            "facebook/bart-large-cnn": self._load_bart_model,
             # T5 Small - Good balance of speed and quality
-            self._load_t5_model()
-            
+            "t5-small": self._load_t5_model,
             # LED (Longformer Encoder-Decoder) - Best for long documents
-            self._load_led_model()
-            
+            "allenai/led-base-16384": self._load_led_model,
             # Pegasus - Excellent for research papers
-            self._load_pegasus_model()
+            "google/pegasus-xsum": self._load_pegasus_model
+        }
+        self._tokenizer_sources = {draft: target for target, draft in settings.SPECULATIVE_DRAFT_MODELS.items()}
+    
+    def preload(self, model_names: List[str]) -> bool:
+        """Load the given models ahead of traffic, returning whether all of them loaded"""
+        try:
+            for model_name in model_names:
+                # Models served by vLLM hold no local weights
+                if not self._is_remote(model_name):
+                    self._ensure_model(model_name)
+            return True
+        except Exception as e:
+            logger.error(f"Error preloading models: {e}")
+            return False
+    
+    def _is_remote(self, model_name: str) -> bool:
+        """Whether the model is served by a vLLM endpoint instead of in-process"""
+        return settings.INFERENCE_BACKEND == "vllm" and model_name in settings.VLLM_ENDPOINTS
+    
+    def _ensure_model(self, model_name: str):
+        """Return tokenizer and model, loading them on first use"""
+        with self._load_lock:
+            if model_name in self.models:
+                self.models.move_to_end(model_name)
+            else:
+                try:
+                    if model_name in self._loaders:
+                        self._loaders[model_name]()
+                    else:
+                        # Draft models for speculative decoding have no dedicated loader
+                        self._load_pretrained(model_name)
+                    self._warmup_model(model_name)
+                except Exception:
+                    # Don't leave a half-loaded or unwarmed model behind to be served on the next call
+                    self.models.pop(model_name, None)
+                    self.tokenizers.pop(model_name, None)
+                    if self.device == "cuda":
+                        torch.cuda.empty_cache()
+                    raise
+                self._evict_models()
             
+            return self.tokenizers[model_name], self.models[model_name]
+    
+    def _evict_models(self):
+        """Unload least recently used models until within the residency budget"""
+        while len(self.models) > settings.MAX_RESIDENT_MODELS:
+            model_name, _ = self.models.popitem(last=False)
+            self.tokenizers.pop(model_name, None)
+            if self.device == "cuda":
+                torch.cuda.empty_cache()
+            logger.info(f"Unloaded {model_name}")
+    
+    def _load_pretrained(self, model_name: str):
+        """Load tokenizer and model weights, quantizing and compiling the model when enabled"""
+        # Draft models share their target's vocabulary, so they reuse its tokenizer when loaded
+        tokenizer_name = self._tokenizer_sources.get(model_name, model_name)
+        if tokenizer_name in self.tokenizers:
+            self.tokenizers[model_name] = self.tokenizers[tokenizer_name]
+        else:
+            self.tokenizers[model_name] = self._load_tokenizer(tokenizer_name)
+        
+        load_kwargs = dict(settings.MODEL_LOAD_KWARGS)
+        load_in_8bit = self._use_8bit(model_name)
+        if settings.QUANTIZE_MODELS and self.device == "cuda":
+            # FP16 halves the weight bandwidth of every decoding step
+            load_kwargs["torch_dtype"] = torch.float16
+        if load_in_8bit:
+            # INT8 weights halve it again; bitsandbytes places the layers itself
+            load_kwargs["quantization_config"] = BitsAndBytesConfig(load_in_8bit=True)
+            load_kwargs["device_map"] = "auto"
+        
+        model = self._from_pretrained(model_name, load_kwargs)
+        if not load_in_8bit:
+            model = model.to(self.device)
+        if settings.QUANTIZE_MODELS and self.device != "cuda":
+            # INT8 dynamic quantization of the Linear layers for CPU inference
+            model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        
+        # bitsandbytes kernels don't trace under torch.compile
+        if settings.TORCH_COMPILE and hasattr(torch, "compile") and not load_in_8bit:
+            try:
+                # generate() calls forward() on the module itself, so compile forward in place
+                model.forward = torch.compile(model.forward, mode="reduce-overhead", fullgraph=False)
+            except Exception as e:
+                logger.warning(f"torch.compile unavailable for {model_name}, running eagerly: {e}")
+        
+        self.models[model_name] = model
+        logger.info(f"Loaded {model_name}")
+    
+    def _use_8bit(self, model_name: str) -> bool:
+        """Whether to load the model with bitsandbytes 8-bit weights"""
+        if not (settings.QUANTIZE_MODELS and self.device == "cuda" and model_name in settings.QUANTIZE_8BIT_MODELS):
+            return False
+        if not is_bitsandbytes_available():
+            logger.warning(f"bitsandbytes is not available, loading {model_name} in FP16")
+            return False
+        return True
+    
+    def _from_pretrained(self, model_name: str, load_kwargs: dict):
+        """Load model weights, falling back to pickled weights for checkpoints without safetensors"""
+        try:
+            return AutoModelForSeq2SeqLM.from_pretrained(model_name, **load_kwargs)
+        except OSError as e:
+            if not load_kwargs.get("use_safetensors"):
+                raise
+            logger.warning(f"No safetensors weights for {model_name}, loading PyTorch weights: {e}")
+            return AutoModelForSeq2SeqLM.from_pretrained(model_name, **{**load_kwargs, "use_safetensors": False})
+    
+    def _load_tokenizer(self, model_name: str):
+        """Load the Rust-backed fast tokenizer, falling back to the Python one"""
+        try:
+            return AutoTokenizer.from_pretrained(model_name, use_fast=True)
         except Exception as e:
-            logger.error(f"Error loading models: {e}")
+            logger.warning(f"No fast tokenizer for {model_name}, using slow tokenizer: {e}")
+            return AutoTokenizer.from_pretrained(model_name, use_fast=False)
+    
+    def _warmup_model(self, model_name: str):
+        """Run a generation at serving shapes so compilation happens at load, not on the request
+        
+        torch.compile only traces on the first call, so a model that fails to compile here
+        falls back to its eager forward.
+        """
+        model = self.models[model_name]
+        try:
+            self._run_warmup(model_name)
+        except Exception as e:
+            if "forward" not in vars(model):
+                raise
+            logger.warning(f"Compiled {model_name} failed during warmup, running eagerly: {e}")
+            # Dropping the instance attribute restores the class's eager forward
+            del model.forward
+            self._run_warmup(model_name)
+        logger.info(f"Warmed up {model_name}")
+    
+    def _run_warmup(self, model_name: str):
+        """Generate once from a typical-length input with the model's serving beam count"""
+        # "the" is a single token in every model's vocabulary, so the input has about WARMUP_INPUT_TOKENS tokens
+        dummy_text = " ".join(["the"] * settings.WARMUP_INPUT_TOKENS)
+        inputs = self._encode(self.tokenizers[model_name], model_name, [dummy_text])
+        with torch.inference_mode():
+            self.models[model_name].generate(**inputs, max_length=64, no_repeat_ngram_size=3,
+                                             num_beams=GENERATION_BEAMS.get(model_name, 1), use_cache=True)
     
     def _load_bart_model(self):
         """Load BART model for general summarization"""
         model_name = "facebook/bart-large-cnn"
-        self.tokenizers[model_name] = AutoTokenizer.from_pretrained(model_name)
-        self.models[model_name] = AutoModelForSeq2SeqLM.from_pretrained(model_name).to(self.device)
-        logger.info(f"Loaded {model_name}")
+        self._load_pretrained(model_name)
     
     def _load_t5_model(self):
         """Load T5 model for fast summarization"""
         model_name = "t5-small"
-        self.tokenizers[model_name] = AutoTokenizer.from_pretrained(model_name)
-        self.models[model_name] = AutoModelForSeq2SeqLM.from_pretrained(model_name).to(self.device)
-        logger.info(f"Loaded {model_name}")
+        self._load_pretrained(model_name)
     
     def _load_led_model(self):
         """Load LED model for long document summarization"""
         model_name = "allenai/led-base-16384"
-        self.tokenizers[model_name] = AutoTokenizer.from_pretrained(model_name)
-        self.models[model_name] = AutoModelForSeq2SeqLM.from_pretrained(model_name).to(self.device)
-        logger.info(f"Loaded {model_name}")
+        self._load_pretrained(model_name)
     
     def _load_pegasus_model(self):
         """Load Pegasus model for research paper summarization"""
         model_name = "google/pegasus-xsum"
-        self.tokenizers[model_name] = AutoTokenizer.from_pretrained(model_name)
-        self.models[model_name] = AutoModelForSeq2SeqLM.from_pretrained(model_name).to(self.device)
-        logger.info(f"Loaded {model_name}")
+        self._load_pretrained(model_name)
     
-    def summarize_with_bart(self, text: str, max_length: int = 500, format_tags: bool = True) -> str:
+    async def summarize_with_bart(self, text: str, max_length: int = 500, format_tags: bool = True,
+                                  use_speculative: bool = False, use_cache: bool = True) -> str:
         """Summarize using BART - Best for news articles and general content"""
         model_name = "facebook/bart-large-cnn"
-        return self._generate_summary(text, model_name, max_length, format_tags)
+        return await self._generate_summary(text, model_name, max_length, format_tags,
+                                            use_speculative=use_speculative, use_cache=use_cache)
     
-    def summarize_with_t5(self, text: str, max_length: int = 500, format_tags: bool = True) -> str:
+    async def summarize_with_t5(self, text: str, max_length: int = 500, format_tags: bool = True,
+                                use_speculative: bool = False, use_cache: bool = True) -> str:
         """Summarize using T5 - Fast and efficient"""
         model_name = "t5-small"
         # T5 requires task prefix
         text = f"summarize: {text}"
-        return self._generate_summary(text, model_name, max_length, format_tags)
+        return await self._generate_summary(text, model_name, max_length, format_tags,
+                                            use_speculative=use_speculative, use_cache=use_cache)
     
-    def summarize_with_led(self, text: str, max_length: int = 500, format_tags: bool = True) -> str:
+    async def summarize_with_led(self, text: str, max_length: int = 500, format_tags: bool = True,
+                                 use_speculative: bool = False, use_cache: bool = True) -> str:
         """Summarize using LED - Best for long documents (up to 16K tokens)"""
         model_name = "allenai/led-base-16384"
-        return self._generate_summary(text, model_name, max_length, format_tags)
+        return await self._generate_summary(text, model_name, max_length, format_tags,
+                                            use_speculative=use_speculative, use_cache=use_cache)
     
-    def summarize_with_pegasus(self, text: str, max_length: int = 500, format_tags: bool = True) -> str:
+    async def summarize_with_pegasus(self, text: str, max_length: int = 500, format_tags: bool = True,
+                                     use_speculative: bool = False, use_cache: bool = True) -> str:
         """Summarize using Pegasus - Best for research papers"""
         model_name = "google/pegasus-xsum"
-        return self._generate_summary(text, model_name, max_length, format_tags)
+        return await self._generate_summary(text, model_name, max_length, format_tags,
+                                            use_speculative=use_speculative, use_cache=use_cache)
     
-    def _generate_summary(self, text: str, model_name: str, max_length: int, format_tags: bool) -> str:
-        """Generate summary using specified model"""
+    async def _generate_summary(self, text: str, model_name: str, max_length: int, format_tags: bool,
+                                use_speculative: bool = False, use_cache: bool = True) -> str:
+        """Generate summary using specified model, batched with concurrent requests
+        
+        Results are looked up in memory, then on disk. With use_cache=False the summary is
+        regenerated and both caches are refreshed.
+        """
         try:
-            tokenizer = self.tokenizers[model_name]
-            model = self.models[model_name]
+            num_beams = GENERATION_BEAMS[model_name]
+            remote = self._is_remote(model_name)
+            # Speculative decoding needs a local draft model that shares the target's vocabulary
+            use_speculative = (use_speculative and not remote
+                               and model_name in settings.SPECULATIVE_DRAFT_MODELS)
             
-            # Tokenize input
-            inputs = tokenizer.encode(
-                text, 
-                return_tensors="pt", 
-                max_length=1024, 
-                truncation=True
-            ).to(self.device)
+            key = hash_key("vllm" if remote else "local", model_name, max_length, num_beams, use_speculative, text)
+            summary = None
+            if use_cache:
+                summary = self.memory_cache.get(key)
+                if summary is None:
+                    summary = summary_cache.get(key)
             
-            # Generate summary
-            with torch.no_grad():
-                summary_ids = model.generate(
-                    inputs, 
-                    max_length=max_length, 
-                    min_length=50,
-                    num_beams=4,
-                    length_penalty=2.0,
-                    early_stopping=True
-                )
-            
-            # Decode summary
-            summary = tokenizer.decode(summary_ids[0], skip_special_tokens=True)
+            if summary is None:
+                if remote:
+                    summary = await self._generate_remote(text, model_name, max_length)
+                else:
+                    summary = await self._get_scheduler(model_name).submit(text, max_length, num_beams, use_speculative)
+                summary_cache[key] = summary
+            self.memory_cache[key] = summary
             
             if format_tags:
-                summary = self._format_with_tags(summary)
+                summary = self.format_with_tags(summary)
             
             return summary
             
@@ -117,28 +301,186 @@ class SummarizationModels:
             logger.error(f"Error generating summary with {model_name}: {e}")
             return f"Error generating summary: {str(e)}"
     
-    def _format_with_tags(self, summary: str) -> str:
+    async def stream_summary(self, text: str, model_name: str, max_length: int = 500,
+                             use_cache: bool = True) -> AsyncIterator[str]:
+        """Yield the raw summary in pieces as the decoder produces them
+        
+        Streaming decodes one greedy sequence outside the batching scheduler. Cached summaries
+        and remote backends yield the whole summary at once.
+        """
+        if model_name == "t5-small":
+            text = f"summarize: {text}"
+        
+        remote = self._is_remote(model_name)
+        key = hash_key("vllm" if remote else "local", model_name, max_length, 1, False, text)
+        summary = None
+        if use_cache:
+            summary = self.memory_cache.get(key)
+            if summary is None:
+                summary = summary_cache.get(key)
+        if summary is not None:
+            yield summary
+            return
+        
+        if remote:
+            summary = await self._generate_remote(text, model_name, max_length)
+            yield summary
+        else:
+            pieces = []
+            async for piece in self._stream_local(text, model_name, max_length):
+                pieces.append(piece)
+                yield piece
+            summary = "".join(pieces).strip()
+        
+        summary_cache[key] = summary
+        self.memory_cache[key] = summary
+    
+    async def _stream_local(self, text: str, model_name: str, max_length: int) -> AsyncIterator[str]:
+        """Run generate() on the inference executor and relay decoded text from its streamer"""
+        loop = asyncio.get_running_loop()
+        tokenizer, model = await loop.run_in_executor(executor, self._ensure_model, model_name)
+        inputs = self._encode(tokenizer, model_name, [text])
+        streamer = TextIteratorStreamer(tokenizer, skip_prompt=True, skip_special_tokens=True)
+        cancelled = threading.Event()
+        
+        def generate():
+            try:
+                with torch.inference_mode():
+                    model.generate(**inputs, max_length=max_length, min_length=50, no_repeat_ngram_size=3,
+                                   num_beams=1, use_cache=True, streamer=streamer,
+                                   stopping_criteria=StoppingCriteriaList([CancelledCriteria(cancelled)]))
+            except Exception:
+                # Unblock the reader, generate() only ends the streamer on success
+                streamer.end()
+                raise
+        
+        async with self.generation_semaphore or nullcontext():
+            generation = loop.run_in_executor(executor, generate)
+            try:
+                # Reading blocks between tokens, so it runs on the default pool, not the inference one
+                while True:
+                    piece = await loop.run_in_executor(None, next, streamer, None)
+                    if piece is None:
+                        break
+                    if piece:
+                        yield piece
+            finally:
+                # A disconnected client stops decoding at the next token, and the slot is held until
+                # generate() has actually returned. Starlette cancels the stream through an anyio
+                # cancel scope that keeps re-raising, so the cleanup has to be shielded from it.
+                with anyio.CancelScope(shield=True):
+                    cancelled.set()
+                    await asyncio.wait([generation])
+                    # Retrieve the outcome even when the reader is gone, so errors aren't left unobserved
+                    error = generation.exception()
+                    if error is not None:
+                        logger.error(f"Error streaming summary with {model_name}: {error}")
+            generation.result()
+    
+    async def _generate_remote(self, text: str, model_name: str, max_length: int) -> str:
+        """Generate summary on a vLLM server, which batches continuously across requests"""
+        # vLLM rejects requests whose prompt plus max_tokens exceed the model's max_model_len, so the
+        # output takes at most half of the model's limit and the server truncates the prompt to the rest
+        limit = INPUT_TOKEN_LIMITS.get(model_name, 1024)
+        max_tokens = min(max_length, limit // 2)
+        payload = {
+            "model": model_name,
+            "prompt": text,
+            "max_tokens": max_tokens,
+            "min_tokens": min(50, max_tokens),
+            "truncate_prompt_tokens": limit - max_tokens,
+            "temperature": 0.0
+        }
+        url = f"{settings.VLLM_ENDPOINTS[model_name]}/v1/completions"
+        timeout = aiohttp.ClientTimeout(total=settings.VLLM_TIMEOUT)
+        async with get_http_session().post(url, json=payload, timeout=timeout) as response:
+            response.raise_for_status()
+            result = await response.json()
+        
+        return result["choices"][0]["text"].strip()
+    
+    def _get_scheduler(self, model_name: str) -> BatchingScheduler:
+        """Return the batching scheduler for a model, creating it on first use"""
+        if model_name not in self.schedulers:
+            self.schedulers[model_name] = BatchingScheduler(
+                lambda texts, *params: self._generate_batch(texts, model_name, *params),
+                semaphore=self.generation_semaphore
+            )
+        return self.schedulers[model_name]
+    
+    def _generate_batch(self, texts: List[str], model_name: str, max_length: int, num_beams: int,
+                        use_speculative: bool) -> List[str]:
+        """Run a single padded forward pass over a batch of texts"""
+        tokenizer, model = self._ensure_model(model_name)
+        
+        generate_kwargs = {
+            "max_length": max_length,
+            "min_length": 50,
+            "no_repeat_ngram_size": 3,
+            "use_cache": True
+        }
+        if use_speculative:
+            # The draft proposes tokens that the target verifies, one greedy sequence at a time
+            _, draft_model = self._ensure_model(settings.SPECULATIVE_DRAFT_MODELS[model_name])
+            generate_kwargs.update(assistant_model=draft_model, num_beams=1)
+            batches = [[text] for text in texts]
+        else:
+            generate_kwargs.update(num_beams=num_beams, length_penalty=2.0, early_stopping=True)
+            batches = [texts]
+        
+        summaries = []
+        for batch in batches:
+            inputs = self._encode(tokenizer, model_name, batch)
+            
+            # Generate summaries
+            with torch.inference_mode():
+                summary_ids = model.generate(**inputs, **generate_kwargs)
+            
+            # Decode summaries
+            summaries.extend(tokenizer.batch_decode(summary_ids, skip_special_tokens=True))
+        
+        return summaries
+    
+    def _encode(self, tokenizer, model_name: str, texts: List[str]):
+        """Tokenize all inputs together, padded to the longest one"""
+        inputs = tokenizer(
+            texts, 
+            return_tensors="pt", 
+            padding=True, 
+            truncation=True, 
+            max_length=INPUT_TOKEN_LIMITS.get(model_name, 1024)
+        ).to(self.device)
+        
+        if model_name == "allenai/led-base-16384":
+            # LED needs global attention on the first token for long-context inference
+            global_attention_mask = torch.zeros_like(inputs["input_ids"])
+            global_attention_mask[:, 0] = 1
+            inputs["global_attention_mask"] = global_attention_mask
+        
+        return inputs
+    
+    def format_with_tags(self, summary: str) -> str:
         """Format summary with HTML-like tags for better structure"""
         sentences = summary.split('. ')
         if len(sentences) <= 1:
             return f"<summary>{summary}</summary>"
         
         # Create structured summary
-        formatted = "<summary>\n"
+        parts = ["<summary>\n"]
         
         # Main summary
-        formatted += f"<main>{sentences[0]}.</main>\n"
+        parts.append(f"<main>{sentences[0]}.</main>\n")
         
         # Key points
         if len(sentences) > 1:
-            formatted += "<key_points>\n"
+            parts.append("<key_points>\n")
             for i, sentence in enumerate(sentences[1:], 1):
                 if sentence.strip():
-                    formatted += f"<point_{i}>{sentence.strip()}{'.' if not sentence.endswith('.') else ''}</point_{i}>\n"
-            formatted += "</key_points>\n"
+                    parts.append(f"<point_{i}>{sentence.strip()}{'.' if not sentence.endswith('.') else ''}</point_{i}>\n")
+            parts.append("</key_points>\n")
         
-        formatted += "</summary>"
-        return formatted
+        parts.append("</summary>")
+        return "".join(parts)
     
     def get_best_model_for_content_type(self, content_type: str) -> str:
         """Return the best model for specific content type"""
@@ -1,45 +1,75 @@
-import PyPDF2
-import io
+from pypdf import PdfReader
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import hashlib
+import re
 import logging
-from typing import Dict, Any
+from typing import Dict, Any, Tuple
 from fastapi import UploadFile
+from app.utils.helpers import build_indicator_automaton, find_indicators
+from diskcache import Cache
+from config.settings import get_settings
 
 logger = logging.getLogger(__name__)
+settings = get_settings()
+
+# Pages of one document share the reader's stream, so each PDF is parsed on a single
+# thread and the pool parallelizes across concurrent uploads
+pdf_executor = ThreadPoolExecutor(max_workers=settings.PDF_WORKERS, thread_name_prefix="pdf")
+
+# Extracted text keyed on a hash of the raw PDF bytes
+pdf_cache = Cache(settings.PDF_CACHE_DIR, size_limit=settings.PDF_CACHE_SIZE_LIMIT)
+
+_WS_RE = re.compile(r'\s+')
+
+class _ArtifactTable(dict):
+    """str.translate table that blanks everything but word characters, whitespace and basic punctuation"""
+    
+    def __missing__(self, codepoint: int) -> str:
+        char = chr(codepoint)
+        keep = char.isalnum() or char.isspace() or char in '_.,!?;:-()'
+        self[codepoint] = char if keep else ' '
+        return self[codepoint]
+
+_ARTIFACT_TABLE = _ArtifactTable()
+
+DOCUMENT_TYPE_INDICATORS = {
+    # Research paper indicators
+    'research': [
+        'abstract', 'introduction', 'methodology', 'results', 'conclusion',
+        'references', 'bibliography', 'doi:', 'arxiv', 'journal', 'conference'
+    ],
+    # Manual/documentation indicators
+    'manual': [
+        'user manual', 'installation', 'configuration', 'setup',
+        'troubleshooting', 'faq', 'documentation', 'guide'
+    ]
+}
 
 class PDFProcessor:
     def __init__(self):
         self.supported_formats = ['.pdf']
+        self.indicator_automaton = build_indicator_automaton(DOCUMENT_TYPE_INDICATORS)
+    
+    async def extract_text_from_pdf(self, file: UploadFile, use_cache: bool = True) -> Dict[str, Any]:
+        """Extract text content from PDF file without blocking the event loop"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(pdf_executor, self._extract_text, file, use_cache)
     
-    async def extract_text_from_pdf(self, file: UploadFile) -> Dict[str, Any]:
-        """Extract text content from PDF file"""
+    def _extract_text(self, file: UploadFile, use_cache: bool) -> Dict[str, Any]:
+        """Extract text from the uploaded PDF, reusing earlier results for identical files"""
         try:
-            # Read the uploaded file
-            content = await file.read()
-            pdf_file = io.BytesIO(content)
-            
-            # Create PDF reader
-            pdf_reader = PyPDF2.PdfReader(pdf_file)
-            
-            # Extract metadata
-            metadata = {
-                'num_pages': len(pdf_reader.pages),
-                'title': pdf_reader.metadata.get('/Title', 'Unknown') if pdf_reader.metadata else 'Unknown',
-                'author': pdf_reader.metadata.get('/Author', 'Unknown') if pdf_reader.metadata else 'Unknown',
-                'subject': pdf_reader.metadata.get('/Subject', 'Unknown') if pdf_reader.metadata else 'Unknown'
-            }
-            
-            # Extract text from all pages
-            text_content = ""
-            for page_num, page in enumerate(pdf_reader.pages):
-                try:
-                    page_text = page.extract_text()
-                    text_content += f"\n--- Page {page_num + 1} ---\n{page_text}\n"
-                except Exception as e:
-                    logger.warning(f"Error extracting text from page {page_num + 1}: {e}")
-                    continue
+            # Read straight from the spooled upload instead of copying it into memory
+            pdf_file = file.file
+            pdf_hash, size = self._hash_file(pdf_file)
             
-            # Clean and preprocess text
-            cleaned_text = self._clean_text(text_content)
+            # Re-uploads of the same document skip parsing entirely
+            cached = pdf_cache.get(pdf_hash) if use_cache else None
+            if cached is not None:
+                cleaned_text, metadata = cached['text'], cached['metadata']
+            else:
+                cleaned_text, metadata = self._parse_pdf(pdf_file)
+                pdf_cache[pdf_hash] = {'text': cleaned_text, 'metadata': metadata}
             
             return {
                 'success': True,
@@ -47,7 +77,7 @@ class PDFProcessor:
                 'metadata': metadata,
                 'file_info': {
                     'filename': file.filename,
-                    'size': len(content),
+                    'size': size,
                     'content_type': file.content_type
                 }
             }
@@ -62,26 +92,50 @@ class PDFProcessor:
                 'file_info': {}
             }
     
-    def _clean_text(self, text: str) -> str:
-        """Clean and preprocess extracted text"""
-        # Remove excessive whitespace
-        lines = text.split('\n')
-        cleaned_lines = []
+    def _hash_file(self, pdf_file) -> Tuple[str, int]:
+        """Hash the upload in chunks, returning its blake2b digest and size in bytes"""
+        digest = hashlib.blake2b(digest_size=16)
+        size = 0
+        pdf_file.seek(0)
+        for chunk in iter(lambda: pdf_file.read(1024 * 1024), b''):
+            digest.update(chunk)
+            size += len(chunk)
+        pdf_file.seek(0)
+        return digest.hexdigest(), size
+    
+    def _parse_pdf(self, pdf_file) -> Tuple[str, Dict[str, Any]]:
+        """Extract cleaned text and document metadata from a PDF stream"""
+        # Create PDF reader
+        pdf_reader = PdfReader(pdf_file)
         
-        for line in lines:
-            line = line.strip()
-            if line and not line.startswith('---'):  # Remove page markers
-                cleaned_lines.append(line)
+        # Extract metadata
+        metadata = {
+            'num_pages': len(pdf_reader.pages),
+            'title': str(pdf_reader.metadata.get('/Title', 'Unknown')) if pdf_reader.metadata else 'Unknown',
+            'author': str(pdf_reader.metadata.get('/Author', 'Unknown')) if pdf_reader.metadata else 'Unknown',
+            'subject': str(pdf_reader.metadata.get('/Subject', 'Unknown')) if pdf_reader.metadata else 'Unknown'
+        }
         
-        # Join lines and handle common PDF artifacts
-        cleaned_text = ' '.join(cleaned_lines)
+        # Extract text from all pages
+        parts = []
+        for page_num, page in enumerate(pdf_reader.pages):
+            try:
+                page_text = page.extract_text()
+                parts.append(page_text)
+            except Exception as e:
+                logger.warning(f"Error extracting text from page {page_num + 1}: {e}")
+                continue
         
-        # Remove excessive spaces
-        import re
-        cleaned_text = re.sub(r'\s+', ' ', cleaned_text)
+        # Clean and preprocess text
+        return self._clean_text("\n".join(parts)), metadata
+    
+    def _clean_text(self, text: str) -> str:
+        """Clean and preprocess extracted text"""
+        # Remove common PDF artifacts in a single pass
+        cleaned_text = text.translate(_ARTIFACT_TABLE)
         
-        # Remove common PDF artifacts
-        cleaned_text = re.sub(r'[^\w\s\.\,\!\?\;\:\-\(\)]', ' ', cleaned_text)
+        # Remove excessive whitespace, including line breaks between pages
+        cleaned_text = _WS_RE.sub(' ', cleaned_text)
         
         return cleaned_text.strip()
     
@@ -90,20 +144,10 @@ class PDFProcessor:
         text_lower = text.lower()
         title_lower = metadata.get('title', '').lower()
         
-        # Research paper indicators
-        research_indicators = [
-            'abstract', 'introduction', 'methodology', 'results', 'conclusion',
-            'references', 'bibliography', 'doi:', 'arxiv', 'journal', 'conference'
-        ]
-        
-        # Manual/documentation indicators
-        manual_indicators = [
-            'user manual', 'installation', 'configuration', 'setup',
-            'troubleshooting', 'faq', 'documentation', 'guide'
-        ]
-        
-        research_score = sum(1 for indicator in research_indicators if indicator in text_lower or indicator in title_lower)
-        manual_score = sum(1 for indicator in manual_indicators if indicator in text_lower or indicator in title_lower)
+        # An indicator counts once whether it appears in the text, the title or both
+        found = find_indicators(self.indicator_automaton, text_lower) | find_indicators(self.indicator_automaton, title_lower)
+        research_score = sum(1 for category, _ in found if category == 'research')
+        manual_score = sum(1 for category, _ in found if category == 'manual')
         
         if research_score > manual_score and research_score >= 3:
             return 'research_paper'
@@ -1,63 +1,98 @@
 from pytube import YouTube
 from youtube_transcript_api import YouTubeTranscriptApi
 import re
+import asyncio
 import logging
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional
 from urllib.parse import urlparse, parse_qs
+from diskcache import Cache
+from config.settings import get_settings
+from app.utils.helpers import build_indicator_automaton, find_indicators
 
 logger = logging.getLogger(__name__)
+settings = get_settings()
+
+# Metadata and transcripts of a video rarely change, so both are cached by video_id
+youtube_cache = Cache(settings.YOUTUBE_CACHE_DIR, size_limit=settings.YOUTUBE_CACHE_SIZE_LIMIT)
+
+_VIDEO_ID_RES = [
+    re.compile(r'(?:youtube\.com/watch\?v=|youtu\.be/|youtube\.com/embed/)([^&\n?#]+)'),
+    re.compile(r'youtube\.com/watch\?.*v=([^&\n?#]+)')
+]
+_BRACKET_RE = re.compile(r'\[.*?\]')
+_PAREN_RE = re.compile(r'\(.*?\)')
+_WS_RE = re.compile(r'\s+')
+
+VIDEO_TYPE_INDICATORS = {
+    # Educational content indicators
+    'educational': [
+        'tutorial', 'how to', 'learn', 'course', 'lesson', 'education',
+        'explain', 'guide', 'introduction to', 'basics of'
+    ],
+    # News/documentary indicators
+    'news': [
+        'news', 'report', 'documentary', 'investigation', 'analysis',
+        'breaking', 'update', 'interview'
+    ],
+    # Technical/research indicators
+    'technical': [
+        'research', 'study', 'paper', 'conference', 'presentation',
+        'technical', 'engineering', 'science', 'algorithm'
+    ],
+    # Entertainment indicators
+    'entertainment': [
+        'funny', 'comedy', 'entertainment', 'music', 'gaming',
+        'reaction', 'vlog', 'challenge'
+    ]
+}
 
 class YouTubeProcessor:
     def __init__(self):
         self.max_duration = 3600  # 1 hour limit
+        self.indicator_automaton = build_indicator_automaton(VIDEO_TYPE_INDICATORS)
     
     def extract_video_id(self, url: str) -> str:
         """Extract video ID from various YouTube URL formats"""
-        patterns = [
-            r'(?:youtube\.com/watch\?v=|youtu\.be/|youtube\.com/embed/)([^&\n?#]+)',
-            r'youtube\.com/watch\?.*v=([^&\n?#]+)'
-        ]
-        
-        for pattern in patterns:
-            match = re.search(pattern, url)
+        for pattern in _VIDEO_ID_RES:
+            match = pattern.search(url)
             if match:
                 return match.group(1)
         
         raise ValueError("Invalid YouTube URL format")
     
-    async def process_youtube_video(self, url: str) -> Dict[str, Any]:
+    async def process_youtube_video(self, url: str, use_cache: bool = True) -> Dict[str, Any]:
         """Process YouTube video and extract transcript"""
         try:
             # Extract video ID
             video_id = self.extract_video_id(url)
             
-            # Get video metadata using pytube
-            yt = YouTube(url)
+            cached = youtube_cache.get(video_id) if use_cache else None
+            if cached is not None:
+                metadata, transcript_data = cached['metadata'], cached['transcript']
+            else:
+                # pytube and the transcript API block on network I/O, so both run in
+                # worker threads, concurrently with each other
+                loop = asyncio.get_running_loop()
+                metadata, transcript_data = await asyncio.gather(
+                    loop.run_in_executor(None, self._fetch_metadata, url, video_id),
+                    loop.run_in_executor(None, self._get_transcript, video_id)
+                )
+                if transcript_data['success']:
+                    youtube_cache.set(
+                        video_id,
+                        {'metadata': metadata, 'transcript': transcript_data},
+                        expire=settings.YOUTUBE_CACHE_TTL
+                    )
             
             # Check duration
-            if yt.length > self.max_duration:
+            if metadata['duration'] > self.max_duration:
                 return {
                     'success': False,
-                    'error': f'Video too long: {yt.length} seconds (max: {self.max_duration})',
+                    'error': f'Video too long: {metadata["duration"]} seconds (max: {self.max_duration})',
                     'transcript': '',
                     'metadata': {}
                 }
             
-            # Extract metadata
-            metadata = {
-                'title': yt.title,
-                'author': yt.author,
-                'duration': yt.length,
-                'views': yt.views,
-                'description': yt.description,
-                'publish_date': yt.publish_date.isoformat() if yt.publish_date else None,
-                'video_id': video_id,
-                'thumbnail': yt.thumbnail_url
-            }
-            
-            # Get transcript
-            transcript_data = self._get_transcript(video_id)
-            
             if not transcript_data['success']:
                 return {
                     'success': False,
@@ -85,6 +120,20 @@ class YouTubeProcessor:
                 'metadata': {}
             }
     
+    def _fetch_metadata(self, url: str, video_id: str) -> Dict[str, Any]:
+        """Get video metadata using pytube, which fetches lazily on attribute access"""
+        yt = YouTube(url)
+        return {
+            'title': yt.title,
+            'author': yt.author,
+            'duration': yt.length,
+            'views': yt.views,
+            'description': yt.description,
+            'publish_date': yt.publish_date.isoformat() if yt.publish_date else None,
+            'video_id': video_id,
+            'thumbnail': yt.thumbnail_url
+        }
+    
     def _get_transcript(self, video_id: str) -> Dict[str, Any]:
         """Get transcript using YouTube Transcript API"""
         try:
@@ -133,18 +182,18 @@ class YouTubeProcessor:
             return ""
         
         # Combine all transcript entries
-        full_text = ""
+        parts = []
         for entry in transcript:
             text = entry.get('text', '').strip()
             if text:
                 # Clean up common transcript artifacts
-                text = re.sub(r'\[.*?\]', '', text)  # Remove [Music], [Applause], etc.
-                text = re.sub(r'\(.*?\)', '', text)  # Remove (inaudible), etc.
+                text = _BRACKET_RE.sub('', text)  # Remove [Music], [Applause], etc.
+                text = _PAREN_RE.sub('', text)  # Remove (inaudible), etc.
                 text = text.replace('\n', ' ')
-                full_text += text + " "
+                parts.append(text)
         
         # Clean up the full text
-        full_text = re.sub(r'\s+', ' ', full_text)  # Multiple spaces to single
+        full_text = _WS_RE.sub(' ', " ".join(parts))  # Multiple spaces to single
         full_text = full_text.strip()
         
         # Add periods to sentences that don't end with punctuation
@@ -164,64 +213,23 @@ class YouTubeProcessor:
         """Detect the type of video content for optimal summarization"""
         title_lower = metadata.get('title', '').lower()
         description_lower = metadata.get('description', '').lower()
-        transcript_lower = transcript.lower()
+        transcript_lower = transcript[:1000].lower()  # First 1000 chars of transcript
         
-        # Educational content indicators
-        educational_indicators = [
-            'tutorial', 'how to', 'learn', 'course', 'lesson', 'education',
-            'explain', 'guide', 'introduction to', 'basics of'
-        ]
-        
-        # News/documentary indicators
-        news_indicators = [
-            'news', 'report', 'documentary', 'investigation', 'analysis',
-            'breaking', 'update', 'interview'
-        ]
-        
-        # Technical/research indicators
-        technical_indicators = [
-            'research', 'study', 'paper', 'conference', 'presentation',
-            'technical', 'engineering', 'science', 'algorithm'
-        ]
-        
-        # Entertainment indicators
-        entertainment_indicators = [
-            'funny', 'comedy', 'entertainment', 'music', 'gaming',
-            'reaction', 'vlog', 'challenge'
-        ]
-        
-        # Count indicators in title, description, and transcript
-        def count_indicators(indicators, text_sources):
-            count = 0
-            for indicator in indicators:
-                for text in text_sources:
-                    if indicator in text:
-                        count += 1
-            return count
-        
-        text_sources = [title_lower, description_lower, transcript_lower[:1000]]  # First 1000 chars of transcript
-        
-        educational_score = count_indicators(educational_indicators, text_sources)
-        news_score = count_indicators(news_indicators, text_sources)
-        technical_score = count_indicators(technical_indicators, text_sources)
-        entertainment_score = count_indicators(entertainment_indicators, text_sources)
+        # Count each indicator once per text source, one automaton pass per source
+        scores = {category: 0 for category in VIDEO_TYPE_INDICATORS}
+        for text in [title_lower, description_lower, transcript_lower]:
+            for category, _ in find_indicators(self.indicator_automaton, text):
+                scores[category] += 1
         
         # Determine video type based on highest score
-        scores = {
-            'educational': educational_score,
-            'news': news_score,
-            'technical': technical_score,
-            'entertainment': entertainment_score
-        }
-        
         max_score = max(scores.values())
         if max_score == 0:
             return 'general'
         
         return max(scores, key=scores.get)
     
-    def get_video_insights(self, metadata: Dict, transcript: str) -> Dict[str, Any]:
-        """Generate insights about the video content"""
+    def get_video_insights(self, metadata: Dict, transcript: str, content_type: Optional[str] = None) -> Dict[str, Any]:
+        """Generate insights about the video content, reusing content_type when already detected"""
         duration_minutes = metadata.get('duration', 0) / 60
         word_count = len(transcript.split())
         
@@ -230,7 +238,7 @@ class YouTubeProcessor:
             'estimated_reading_time': round(word_count / 200, 2),  # Average reading speed
             'word_count': word_count,
             'content_density': 'high' if word_count / duration_minutes > 150 else 'medium' if word_count / duration_minutes > 100 else 'low',
-            'video_type': self._detect_video_type(metadata, transcript)
+            'video_type': content_type if content_type is not None else self._detect_video_type(metadata, transcript)
         }
         
         return insights
\ No newline at end of file
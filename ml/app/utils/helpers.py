@@ -1,17 +1,51 @@
 import os
+import re
+import hashlib
+import queue
+import atexit
 import logging
+from logging.handlers import QueueHandler, QueueListener
 from datetime import datetime
-from typing import Dict, Any
+from pathlib import Path
+from typing import Dict, Any, List, Set, Tuple
+
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
+
+_CLEAN_RE = re.compile(r'[^\w\-_\.]')
+_UND_RE = re.compile(r'_+')
+
+_log_listener = None
 
 def setup_logging():
-    """Setup logging configuration"""
+    """Setup logging configuration, writing records from a background thread"""
+    global _log_listener
+    if _log_listener is not None:
+        return
+    
+    formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    handlers = [
+        logging.FileHandler('ml_api.log'),
+        logging.StreamHandler()
+    ]
+    for handler in handlers:
+        handler.setFormatter(formatter)
+    
+    # Request paths only enqueue records; the listener thread does the blocking writes
+    log_queue = queue.Queue(-1)
+    _log_listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _log_listener.start()
+    atexit.register(_log_listener.stop)
+    
+    # Only merge the message here; the listener's handlers apply the full format
+    queue_handler = QueueHandler(log_queue)
+    queue_handler.setFormatter(logging.Formatter('%(message)s'))
+    
     logging.basicConfig(
         level=logging.INFO,
-        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-        handlers=[
-            logging.FileHandler('ml_api.log'),
-            logging.StreamHandler()
-        ]
+        handlers=[queue_handler]
     )
 
 def ensure_directories():
@@ -23,7 +57,8 @@ def ensure_directories():
     ]
     
     for directory in directories:
-        os.makedirs(directory, exist_ok=True)
+        # mkdir with exist_ok is a single syscall, no separate existence check
+        Path(directory).mkdir(parents=True, exist_ok=True)
 
 def validate_file_size(file_size: int, max_size: int = 50 * 1024 * 1024) -> bool:
     """Validate file size"""
@@ -43,11 +78,10 @@ def get_file_extension(filename: str) -> str:
 
 def clean_filename(filename: str) -> str:
     """Clean filename for safe storage"""
-    import re
     # Remove special characters and spaces
-    cleaned = re.sub(r'[^\w\-_\.]', '_', filename)
+    cleaned = _CLEAN_RE.sub('_', filename)
     # Remove multiple underscores
-    cleaned = re.sub(r'_+', '_', cleaned)
+    cleaned = _UND_RE.sub('_', cleaned)
     return cleaned
 
 def generate_response_metadata(processing_time: float, model_used: str, input_size: int) -> Dict[str, Any]:
@@ -58,4 +92,48 @@ def generate_response_metadata(processing_time: float, model_used: str, input_si
         'input_size_chars': input_size,
         'timestamp': datetime.utcnow().isoformat(),
         'api_version': '1.0.0'
-    }
\ No newline at end of file
+    }
+
+def hash_key(*parts: Any) -> str:
+    """Build a compact cache key from the given parts"""
+    data = "|".join(str(part) for part in parts).encode()
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+class RegexIndicatorMatcher:
+    """Fallback for pyahocorasick: a single precompiled regex with the Automaton.iter interface"""
+    
+    def __init__(self, indicators: Dict[str, List[str]]):
+        self.categories = {word: category for category, words in indicators.items() for word in words}
+        # One optional lookahead group per word length: words of equal length can't be prefixes of
+        # each other, so every indicator starting at a position is reported, overlapping like in the
+        # automaton. The final lookahead skips positions where nothing matches.
+        buckets = {}
+        for word in self.categories:
+            buckets.setdefault(len(word), []).append(re.escape(word))
+        alternations = ['|'.join(words) for _, words in sorted(buckets.items(), reverse=True)]
+        self.pattern = re.compile(
+            ''.join(f'(?:(?=({words})))?' for words in alternations) + f"(?={'|'.join(alternations)})"
+        )
+    
+    def iter(self, text: str):
+        for match in self.pattern.finditer(text):
+            for group in range(1, self.pattern.groups + 1):
+                word = match.group(group)
+                if word is not None:
+                    yield match.end(group) - 1, (self.categories[word], word)
+
+def build_indicator_automaton(indicators: Dict[str, List[str]]):
+    """Build an Aho-Corasick automaton over indicator keywords tagged with their category"""
+    if ahocorasick is None:
+        return RegexIndicatorMatcher(indicators)
+    
+    automaton = ahocorasick.Automaton()
+    for category, words in indicators.items():
+        for word in words:
+            automaton.add_word(word, (category, word))
+    automaton.make_automaton()
+    return automaton
+
+def find_indicators(automaton, text: str) -> Set[Tuple[str, str]]:
+    """Return the distinct (category, indicator) pairs present in text, in a single pass"""
+    return {match for _, match in automaton.iter(text)}
\ No newline at end of file
@@ -1,28 +1,190 @@
 import os
+from functools import lru_cache
+from typing import Any, Dict, List, Optional
 from dotenv import load_dotenv
+from pydantic import Field, field_validator
+from pydantic_settings import BaseSettings, SettingsConfigDict
 
 load_dotenv()
 
-class Settings:
+# Point the Hugging Face cache at a persistent volume. This module has to be imported
+# before transformers, which reads these variables at import time.
+HF_CACHE_DIR = os.path.abspath(os.getenv("HF_HOME", "models/huggingface"))
+os.environ.setdefault("HF_HOME", HF_CACHE_DIR)
+os.environ.setdefault("HF_HUB_CACHE", os.path.join(HF_CACHE_DIR, "hub"))
+os.environ.setdefault("TRANSFORMERS_CACHE", os.path.join(HF_CACHE_DIR, "hub"))
+
+# OpenMP and MKL size their thread pools when torch loads, so an explicit count has to be exported first
+if int(os.getenv("ML_INTRAOP_THREADS", "0")) > 0:
+    os.environ.setdefault("OMP_NUM_THREADS", os.environ["ML_INTRAOP_THREADS"])
+    os.environ.setdefault("MKL_NUM_THREADS", os.environ["ML_INTRAOP_THREADS"])
+
+# In production every model is already in the cache, so skip Hub metadata requests
+PRODUCTION = os.getenv("PRODUCTION", "false").lower() == "true"
+if PRODUCTION:
+    os.environ.setdefault("HF_HUB_OFFLINE", "1")
+
+@lru_cache
+def _probe_device(force_device: Optional[str]) -> str:
+    """Probe CUDA once per process, torch is only imported on first call"""
+    if force_device:
+        return force_device
+    import torch
+    return "cuda" if torch.cuda.is_available() else "cpu"
+
+class Settings(BaseSettings):
+    model_config = SettingsConfigDict(env_file=".env", frozen=True, extra="ignore", populate_by_name=True)
+    
     # API Configuration
-    API_HOST = "0.0.0.0"
-    API_PORT = 8000
+    API_HOST: str = "0.0.0.0"
+    API_PORT: int = 8000
+    DEV_RELOAD: bool = False  # Development only, reloads drop preloaded models
+    UVICORN_WORKERS: int = 1  # Each worker holds its own copy of the models
+    UVICORN_LOOP: str = "uvloop"  # libuv event loop, use "asyncio" where uvloop is unavailable (Windows)
+    UVICORN_HTTP: str = "httptools"  # C HTTP parser instead of the pure Python h11
+    
+    # Comma-separated origins allowed to call the API from a browser (Vite dev client and Node server by default)
+    CORS_ORIGINS: str = "http://localhost:5173,http://localhost:7000"
+    CORS_MAX_AGE: int = 86400  # Browsers cache preflight responses for a day
     
     # Model Configuration
-    SUMMARIZATION_MODEL = "facebook/bart-large-cnn"
-    LONG_FORM_MODEL = "microsoft/DialoGPT-large"
-    EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+    SUMMARIZATION_MODEL: str = "facebook/bart-large-cnn"
+    LONG_FORM_MODEL: str = "microsoft/DialoGPT-large"
+    EMBEDDING_MODEL: str = "sentence-transformers/all-MiniLM-L6-v2"
+    PRELOAD_EMBEDDER: bool = False  # Load and warm the shared embedding model at startup, enable once a route uses it
+    
+    # Passed to every from_pretrained call: mmap safetensors weights and skip random init
+    MODEL_LOAD_KWARGS: Dict[str, Any] = {
+        "use_safetensors": True,
+        "low_cpu_mem_usage": True,
+        "torch_dtype": "auto"
+    }
+    
+    # Batching Configuration
+    MAX_BATCH: int = 8
+    MAX_WAIT_MS: int = 20  # How long to wait for a batch to fill after the first request
+    
+    # Speculative Decoding: small draft models sharing each target model's tokenizer
+    SPECULATIVE_DRAFT_MODELS: Dict[str, str] = {
+        "facebook/bart-large-cnn": "sshleifer/distilbart-cnn-12-6",
+        "google/pegasus-xsum": "sshleifer/distill-pegasus-xsum-16-4"
+    }
+    
+    # Inference Backend: "local" runs the models in-process, "vllm" forwards models with a configured
+    # endpoint to vLLM servers and runs the rest in-process. Of these models vLLM only serves BART.
+    INFERENCE_BACKEND: str = "local"
+    VLLM_BART_URL: str = "http://localhost:8001"
+    VLLM_T5_URL: str = ""
+    VLLM_LED_URL: str = ""
+    VLLM_PEGASUS_URL: str = ""
+    VLLM_TIMEOUT: int = 120  # seconds
     
     # File Upload Configuration
-    MAX_FILE_SIZE = 50 * 1024 * 1024  # 50MB
-    UPLOAD_DIR = "data/uploads"
-    PROCESSED_DIR = "data/processed"
+    MAX_FILE_SIZE: int = 50 * 1024 * 1024  # 50MB
+    UPLOAD_DIR: str = "data/uploads"
+    PROCESSED_DIR: str = "data/processed"
+    PDF_WORKERS: int = 8  # Threads parsing uploaded PDFs
+    
+    # Cache Configuration
+    SUMMARY_CACHE_DIR: str = "data/processed/summary_cache"
+    SUMMARY_CACHE_SIZE_LIMIT: int = 10 * 1024 * 1024 * 1024  # 10GB
+    MEMORY_CACHE_SIZE: int = 1024  # Recent summaries also kept in process
+    MEMORY_CACHE_TTL: int = 3600  # seconds
+    PDF_CACHE_DIR: str = "data/processed/pdf_cache"
+    PDF_CACHE_SIZE_LIMIT: int = 2 * 1024 * 1024 * 1024  # 2GB
+    YOUTUBE_CACHE_DIR: str = "data/processed/yt_cache"
+    YOUTUBE_CACHE_SIZE_LIMIT: int = 1 * 1024 * 1024 * 1024  # 1GB
+    YOUTUBE_CACHE_TTL: int = 7 * 24 * 3600  # 1 week in seconds
     
     # YouTube Configuration
-    MAX_VIDEO_DURATION = 3600  # 1 hour in seconds
+    MAX_VIDEO_DURATION: int = 3600  # 1 hour in seconds
     
     # Device Configuration
-    DEVICE = "cuda" if os.getenv("CUDA_AVAILABLE", "false").lower() == "true" else "cpu"
+    FORCE_DEVICE: Optional[str] = None  # Override CUDA detection, e.g. "cpu"
+    
+    # Threads running model generation, 0 picks one on GPU and one per core on CPU
+    INFERENCE_WORKERS: int = 0
+    
+    # Intra-op threads per generation, 0 splits the cores evenly across the inference workers
+    INTRAOP_THREADS: int = Field(0, alias="ML_INTRAOP_THREADS")
+    
+    # Batch generations running at once across all models, 0 matches the inference workers
+    MAX_CONCURRENT_GENERATIONS: int = Field(0, alias="ML_MAX_CONCURRENCY")
+    
+    # Comma-separated models loaded at startup; the rest load on first use
+    PRELOAD_MODELS_CSV: str = Field("facebook/bart-large-cnn", alias="PRELOAD_MODELS")
+    
+    # Maximum number of summarization models kept in memory at once
+    MAX_RESIDENT_MODELS: int = 2
+    
+    # Load models in FP16 on GPU and INT8 (dynamic quantization) on CPU
+    QUANTIZE_MODELS: bool = True
+    
+    # Comma-separated models loaded with bitsandbytes 8-bit weights on GPU instead of FP16
+    QUANTIZE_8BIT_MODELS_CSV: str = Field("facebook/bart-large-cnn", alias="QUANTIZE_8BIT_MODELS")
+    
+    # Compile models with torch.compile at load time (requires torch >= 2.0)
+    TORCH_COMPILE: bool = True
+    WARMUP_INPUT_TOKENS: int = 512  # Input length of the load-time warmup, close to typical requests
+    
+    # Hugging Face Cache
+    HF_CACHE_DIR: str = HF_CACHE_DIR
+    PRODUCTION: bool = PRODUCTION
     
     # Hugging Face Token (optional, for private models)
-    HF_TOKEN = os.getenv("HUGGINGFACE_TOKEN", None)
\ No newline at end of file
+    HF_TOKEN: Optional[str] = Field(None, alias="HUGGINGFACE_TOKEN")
+    
+    @field_validator("INFERENCE_BACKEND")
+    @classmethod
+    def _lower_backend(cls, value: str) -> str:
+        return value.lower()
+    
+    @property
+    def ALLOWED_ORIGINS(self) -> List[str]:
+        return [origin.strip() for origin in self.CORS_ORIGINS.split(",") if origin.strip()]
+    
+    @property
+    def PRELOAD_MODELS(self) -> List[str]:
+        return [model for model in self.PRELOAD_MODELS_CSV.split(",") if model]
+    
+    @property
+    def QUANTIZE_8BIT_MODELS(self) -> List[str]:
+        return [model for model in self.QUANTIZE_8BIT_MODELS_CSV.split(",") if model]
+    
+    @property
+    def VLLM_ENDPOINTS(self) -> Dict[str, str]:
+        endpoints = {
+            "facebook/bart-large-cnn": self.VLLM_BART_URL,
+            "t5-small": self.VLLM_T5_URL,
+            "allenai/led-base-16384": self.VLLM_LED_URL,
+            "google/pegasus-xsum": self.VLLM_PEGASUS_URL
+        }
+        # Models without an endpoint stay in-process
+        return {model: url for model, url in endpoints.items() if url}
+    
+    def device(self) -> str:
+        """Return the inference device, probing CUDA on first call"""
+        return _probe_device(self.FORCE_DEVICE)
+    
+    def inference_workers(self) -> int:
+        """Return the number of generation threads for the detected device"""
+        if self.INFERENCE_WORKERS > 0:
+            return self.INFERENCE_WORKERS
+        return 1 if self.device() == "cuda" else os.cpu_count() or 1
+    
+    def intraop_threads(self) -> int:
+        """Return torch's intra-op thread count, keeping workers times threads within the core count"""
+        if self.INTRAOP_THREADS > 0:
+            return self.INTRAOP_THREADS
+        return max(1, (os.cpu_count() or 1) // self.inference_workers())
+    
+    def max_concurrency(self) -> int:
+        """Return how many batch generations may run at once"""
+        if self.MAX_CONCURRENT_GENERATIONS > 0:
+            return self.MAX_CONCURRENT_GENERATIONS
+        return self.inference_workers()
+
+@lru_cache
+def get_settings() -> Settings:
+    """Build the settings once from the environment and .env"""
+    return Settings()
@@ -1,86 +1,240 @@
-from fastapi import FastAPI, HTTPException
+# Settings come first, they configure the Hugging Face cache before transformers loads
+from config.settings import get_settings
+from fastapi import FastAPI, HTTPException, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import ORJSONResponse
+from contextlib import asynccontextmanager
+import asyncio
+import hashlib
+import orjson
 import uvicorn
-from app.api.summarization import router as summarization_router
 from app.utils.helpers import setup_logging, ensure_directories
-from config.settings import Settings
+from app.utils.http_client import get_http_session, close_http_session
 import logging
 
-# Setup logging and directories
+# Setup logging
 setup_logging()
-ensure_directories()
 
 logger = logging.getLogger(__name__)
+settings = get_settings()
+
+# Static payloads are built once at import instead of per request
+_STATIC_CACHE_HEADERS = {"Cache-Control": "public, max-age=86400"}
+
+_ROOT_PAYLOAD = {
+    "message": "DocAI ML API is running!",
+    "version": "1.0.0",
+    "docs": "/docs",
+    "health": "/health"
+}
+
+# Health bodies are serialized up front, probes only pick one
+_HEALTH_READY = orjson.dumps({
+    "status": "healthy",
+    "service": "ml-api",
+    "models_loaded": True
+})
+_HEALTH_NOT_READY = orjson.dumps({
+    "status": "unavailable",
+    "service": "ml-api",
+    "models_loaded": False
+})
+
+_INFO_PAYLOAD = {
+    "service": "DocAI ML API",
+    "version": "1.0.0",
+    "capabilities": {
+        "text_summarization": True,
+        "pdf_processing": True,
+        "youtube_processing": True,
+        "multi_model_support": True,
+        "formatted_output": True
+    },
+    "supported_models": [
+        "facebook/bart-large-cnn",
+        "t5-small", 
+        "allenai/led-base-16384",
+        "google/pegasus-xsum"
+    ],
+    "endpoints": {
+        "text_summarization": "/api/v1/summarize/text",
+        "pdf_summarization": "/api/v1/summarize/pdf",
+        "youtube_summarization": "/api/v1/summarize/youtube",
+        "models_info": "/api/v1/models/info"
+    }
+}
+_INFO_BODY = orjson.dumps(_INFO_PAYLOAD)
+# Changes only when the payload does, i.e. between deploys
+_INFO_ETAG = f'"{hashlib.blake2b(_INFO_BODY, digest_size=8).hexdigest()}"'
+_INFO_HEADERS = {"ETag": _INFO_ETAG, "Cache-Control": "public, max-age=3600"}
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    app.state.models_loaded = False
+    
+    # Create the data directories once per process, not on every import of main
+    if not getattr(app.state, "dirs_ready", False):
+        ensure_directories()
+        app.state.dirs_ready = True
+    
+    # The router pulls in torch and transformers, import it here so importing main stays cheap
+    from app.api.summarization import router as summarization_router, summarization_models
+    app.include_router(summarization_router, prefix="/api/v1", tags=["summarization"])
+    internal_app.include_router(summarization_router, tags=["summarization"])
+    
+    # Split the cores between inference workers instead of letting each one claim all of them
+    import torch
+    torch.set_num_threads(settings.intraop_threads())
+    try:
+        torch.set_num_interop_threads(1)
+    except RuntimeError:
+        # Only allowed before any inter-op work has started
+        pass
+    
+    # Bound concurrent batch generations so queued requests wait here instead of piling onto the device
+    app.state.gpu_sem = asyncio.Semaphore(settings.max_concurrency())
+    summarization_models.generation_semaphore = app.state.gpu_sem
+    
+    # Open the shared HTTP session up front instead of on the first outbound call
+    get_http_session()
+    
+    # Load the default models before serving so the first request doesn't pay for it
+    loop = asyncio.get_running_loop()
+    app.state.models_loaded = await loop.run_in_executor(None, summarization_models.preload, settings.PRELOAD_MODELS)
+    
+    # Shared embedding model, loaded once here instead of by whichever request first needs it
+    if settings.PRELOAD_EMBEDDER:
+        try:
+            from app.models.embedder import get_embedder
+            await loop.run_in_executor(None, get_embedder)
+        except Exception as e:
+            logger.error(f"Error loading embedding model: {e}")
+    
+    yield
+    
+    await close_http_session()
 
 app = FastAPI(
     title="DocAI ML API",
     description="Advanced ML API for document and video summarization using state-of-the-art models",
     version="1.0.0",
     docs_url="/docs",
-    redoc_url="/redoc"
+    redoc_url="/redoc",
+    default_response_class=ORJSONResponse,  # orjson serializes in C, several times faster than json
+    lifespan=lifespan
 )
 
+class BodySizeLimitMiddleware:
+    """Reject requests whose Content-Length exceeds max_size with 413 before any body is read"""
+    
+    def __init__(self, app, max_size: int):
+        self.app = app
+        self.max_size = max_size
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http":
+            content_length = dict(scope["headers"]).get(b"content-length")
+            if content_length is not None and content_length.isdigit() and int(content_length) > self.max_size:
+                response = ORJSONResponse({"detail": "Request body too large"}, status_code=413)
+                await response(scope, receive, send)
+                return
+        await self.app(scope, receive, send)
+
+class StreamAwareGZipMiddleware(GZipMiddleware):
+    """GZipMiddleware that passes server-sent event streams through untouched
+    
+    gzip would hold the events back until its buffer fills, defeating the stream.
+    """
+    
+    def __init__(self, app, excluded_paths=("/summarize/text/stream",), **kwargs):
+        super().__init__(app, **kwargs)
+        self.excluded_paths = tuple(excluded_paths)
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["path"].endswith(self.excluded_paths):
+            await self.app(scope, receive, send)
+            return
+        await super().__call__(scope, receive, send)
+
+# Service-to-service traffic gets the same routes without the browser-facing CORS layer
+internal_app = FastAPI(
+    title="DocAI ML API (internal)",
+    docs_url=None,
+    redoc_url=None,
+    openapi_url=None,
+    default_response_class=ORJSONResponse
+)
+internal_app.add_middleware(BodySizeLimitMiddleware, max_size=settings.MAX_FILE_SIZE)
+internal_app.add_middleware(StreamAwareGZipMiddleware, minimum_size=1024, compresslevel=5)
+
+class InternalDispatchMiddleware:
+    """Hand requests under a prefix to another app before the rest of the middleware stack runs"""
+    
+    def __init__(self, app, internal_app, prefix: str = "/internal"):
+        self.app = app
+        self.internal_app = internal_app
+        self.prefix = prefix
+    
+    async def __call__(self, scope, receive, send):
+        path = scope.get("path", "")
+        if scope["type"] == "http" and (path == self.prefix or path.startswith(self.prefix + "/")):
+            # Same path rewrite as a Starlette Mount
+            scope = dict(scope, path=path[len(self.prefix):] or "/", root_path=scope.get("root_path", "") + self.prefix)
+            await self.internal_app(scope, receive, send)
+            return
+        await self.app(scope, receive, send)
+
+# Oversized uploads are refused from the headers; it sits inside CORS so browsers can read the 413
+app.add_middleware(BodySizeLimitMiddleware, max_size=settings.MAX_FILE_SIZE)
+
 # CORS middleware
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=["*"],  # Configure this properly for production
+    allow_origins=settings.ALLOWED_ORIGINS,
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    max_age=settings.CORS_MAX_AGE,
 )
 
-# Include routers
-app.include_router(summarization_router, prefix="/api/v1", tags=["summarization"])
+# Compress summaries and metadata for clients sending Accept-Encoding: gzip, tiny bodies aren't worth it
+app.add_middleware(StreamAwareGZipMiddleware, minimum_size=1024, compresslevel=5)
+
+# Added last so it is outermost: /internal calls skip CORS and GZip of the public app
+app.add_middleware(InternalDispatchMiddleware, internal_app=internal_app)
 
 @app.get("/")
 async def root():
-    return {
-        "message": "DocAI ML API is running!",
-        "version": "1.0.0",
-        "docs": "/docs",
-        "health": "/health"
-    }
+    return ORJSONResponse(_ROOT_PAYLOAD, headers=_STATIC_CACHE_HEADERS)
 
-@app.get("/health")
-async def health_check():
-    return {
-        "status": "healthy",
-        "service": "ml-api",
-        "models_loaded": "true"
-    }
+async def health_check(request: Request) -> Response:
+    """Report readiness, 503 when the default models failed to preload"""
+    if not getattr(request.app.state, "models_loaded", False):
+        return Response(_HEALTH_NOT_READY, status_code=503, media_type="application/json")
+    return Response(_HEALTH_READY, media_type="application/json")
+
+# Plain Starlette route: probes skip FastAPI's dependency and validation handling
+app.add_route("/health", health_check, methods=["GET"], include_in_schema=False)
 
 @app.get("/api/v1/info")
-async def api_info():
-    """Get API information and capabilities"""
-    return {
-        "service": "DocAI ML API",
-        "version": "1.0.0",
-        "capabilities": {
-            "text_summarization": True,
-            "pdf_processing": True,
-            "youtube_processing": True,
-            "multi_model_support": True,
-            "formatted_output": True
-        },
-        "supported_models": [
-            "facebook/bart-large-cnn",
-            "t5-small", 
-            "allenai/led-base-16384",
-            "google/pegasus-xsum"
-        ],
-        "endpoints": {
-            "text_summarization": "/api/v1/summarize/text",
-            "pdf_summarization": "/api/v1/summarize/pdf",
-            "youtube_summarization": "/api/v1/summarize/youtube",
-            "models_info": "/api/v1/models/info"
-        }
-    }
+async def api_info(request: Request):
+    """Get API information and capabilities, 304 when the client's copy is current"""
+    if_none_match = request.headers.get("if-none-match", "")
+    if if_none_match == "*" or _INFO_ETAG in if_none_match:
+        return Response(status_code=304, headers=_INFO_HEADERS)
+    return Response(_INFO_BODY, media_type="application/json", headers=_INFO_HEADERS)
 
 if __name__ == "__main__":
     logger.info("Starting DocAI ML API...")
-    uvicorn.run(
-        app, 
-        host=Settings.API_HOST, 
-        port=Settings.API_PORT,
-        reload=True
-    )
\ No newline at end of file
+    server_options = dict(
+        host=settings.API_HOST,
+        port=settings.API_PORT,
+        loop=settings.UVICORN_LOOP,
+        http=settings.UVICORN_HTTP
+    )
+    if settings.DEV_RELOAD or settings.UVICORN_WORKERS > 1:
+        # Reload and multiple workers need the app as an import string and uvicorn's supervisor
+        uvicorn.run("main:app", reload=settings.DEV_RELOAD, workers=settings.UVICORN_WORKERS, **server_options)
+    else:
+        uvicorn.Server(uvicorn.Config(app, **server_options)).run()